@@ -1,16 +1,20 @@
 # backtesting/backtest_stocks.py
 
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
 import pandas as pd
-import random
-from utils.market_data_analysis import download_tranform
+from utils.market_data_analysis import download_tranform, compute_emas
+from utils._njit import njit
 
 def compute_macd_signal(df, signal_span=9):
     """
     Computes the MACD signal line as the EMA of the MACD.
     Assumes the DataFrame already has a 'MACD' column.
+    The 'Signal' column is added to df in place; df is also returned for chaining.
     """
-    df = df.copy()
-    df['Signal'] = df['MACD'].ewm(span=signal_span, adjust=False).mean()
+    df['Signal'] = compute_emas(df['MACD'].to_numpy(), (signal_span,))[0]
     return df
 
 def generate_signals(df):
@@ -23,62 +27,61 @@ def generate_signals(df):
     
     Adds the following column:
       - 'SignalFlag': 1 for buy, -1 for sell, 0 otherwise.
+    The column is added to df in place; df is also returned for chaining.
     """
-    df = df.copy()
-    df['SignalFlag'] = 0
-
-    for i in range(1, len(df)):
-        # Buy signal: MACD crosses above Signal
-        if (df.loc[i-1, 'MACD'] < df.loc[i-1, 'Signal']) and (df.loc[i, 'MACD'] > df.loc[i, 'Signal']):
-            df.loc[i, 'SignalFlag'] = 1
-        # Sell signal: MACD crosses below Signal
-        elif (df.loc[i-1, 'MACD'] > df.loc[i-1, 'Signal']) and (df.loc[i, 'MACD'] < df.loc[i, 'Signal']):
-            df.loc[i, 'SignalFlag'] = -1
-        else:
-            df.loc[i, 'SignalFlag'] = 0
+    # The sign of (MACD - Signal) flips from -1 to +1 on an upward cross and
+    # from +1 to -1 on a downward cross, so the step between rows is +/-2.
+    s = np.sign(df['MACD'].to_numpy() - df['Signal'].to_numpy())
+    cross = np.diff(s, prepend=s[:1])
+    df['SignalFlag'] = np.where(cross == 2, 1, np.where(cross == -2, -1, 0)).astype(np.int8)
 
     return df
 
 def prepare_backtest_data(stock_symbol='AAPL', data_period='1y'):
     """
     Prepares data for backtesting:
-      1. Downloads and processes market data using your existing download_tranform().
+      1. Downloads and processes price data using download_tranform() (IV data is not needed).
       2. Computes the MACD signal line.
       3. Generates buy/sell signals based solely on MACD.
       
     Returns a DataFrame ready for simulation.
     """
-    df = download_tranform(stock_symbol, data_period)
+    df = download_tranform(stock_symbol, data_period, use_iv=False)
     df = compute_macd_signal(df)
     df = generate_signals(df)
     return df
 
-def simulate_macd_strategy(df, initial_capital=100000):
+@njit(cache=True)
+def _simulate_macd_core(prices, flags, initial_capital):
     """
-    Simulates trades based on the MACD strategy.
-    Uses a fixed budget and goes all-in when a buy signal occurs and sells all on a sell signal.
-    
-    Returns:
-      - Updated DataFrame with columns: 'PortfolioValue', 'Cash', 'Shares'.
-      - A trade log DataFrame with trade details.
+    Core all-in/all-out loop of the MACD strategy over raw arrays.
+    Only rows with a non-zero signal are visited; cash and shares are constant
+    between trades, so their histories are rebuilt afterwards by repeating the
+    state after each trade up to the next one.
+    Trades are recorded into preallocated arrays (action: 1 = buy, -1 = sell)
+    and trimmed to the number of trades actually made.
     """
-    cash = initial_capital
+    n = prices.shape[0]
+    event_idx = np.flatnonzero(flags != 0)
+    m = event_idx.shape[0]
+    cash = float(initial_capital)
     shares = 0
-    buy_price = None
-
-    portfolio_values = []
-    cash_history = []
-    shares_history = []
-    trade_log = []
+    buy_price = 0.0
 
-    for index, row in df.iterrows():
-        current_price = row['c_price']
-        portfolio_value = cash + shares * current_price
-        portfolio_values.append(portfolio_value)
-        cash_history.append(cash)
-        shares_history.append(shares)
+    trade_indices = np.empty(m, dtype=np.int64)
+    trade_actions = np.empty(m, dtype=np.int8)
+    trade_shares = np.empty(m, dtype=np.int32)
+    trade_pnls = np.empty(m)
+    # State after each trade, seeded with the initial state.
+    state_cash = np.empty(m + 1)
+    state_shares = np.empty(m + 1, dtype=np.int32)
+    state_cash[0] = cash
+    state_shares[0] = 0
+    n_trades = 0
 
-        signal = row['SignalFlag']
+    for i in event_idx:
+        current_price = prices[i]
+        signal = flags[i]
         if signal == 1 and shares == 0:
             # Buy all-in: purchase as many shares as possible.
             shares_to_buy = int(cash // current_price)
@@ -86,51 +89,172 @@ def simulate_macd_strategy(df, initial_capital=100000):
                 buy_price = current_price
                 cash -= shares_to_buy * current_price
                 shares = shares_to_buy
-                trade_log.append({
-                    'Date': row['date'],
-                    'Action': 'Buy',
-                    'Shares': shares_to_buy,
-                    'Price': current_price,
-                    'Signal': signal,
-                    'PnL': None
-                })
+                trade_indices[n_trades] = i
+                trade_actions[n_trades] = 1
+                trade_shares[n_trades] = shares_to_buy
+                trade_pnls[n_trades] = np.nan
+                n_trades += 1
+                state_cash[n_trades] = cash
+                state_shares[n_trades] = shares
         elif signal == -1 and shares > 0:
-            sell_price = current_price
-            pnl = (sell_price - buy_price) * shares
-            cash += shares * sell_price
-            trade_log.append({
-                'Date': row['date'],
-                'Action': 'Sell',
-                'Shares': shares,
-                'Price': sell_price,
-                'Signal': signal,
-                'PnL': pnl
-            })
+            pnl = (current_price - buy_price) * shares
+            cash += shares * current_price
+            trade_indices[n_trades] = i
+            trade_actions[n_trades] = -1
+            trade_shares[n_trades] = shares
+            trade_pnls[n_trades] = pnl
+            n_trades += 1
             shares = 0
-            buy_price = None
+            state_cash[n_trades] = cash
+            state_shares[n_trades] = shares
+
+    # History rows record the state at the start of the bar, so a trade on
+    # row i takes effect from row i + 1 onwards.
+    bounds = np.empty(n_trades + 2, dtype=np.int64)
+    bounds[0] = 0
+    bounds[1:n_trades + 1] = trade_indices[:n_trades] + 1
+    bounds[n_trades + 1] = n
+    lengths = np.diff(bounds)
+    cash_history = np.repeat(state_cash[:n_trades + 1], lengths)
+    shares_history = np.repeat(state_shares[:n_trades + 1], lengths)
+    portfolio_values = cash_history + shares_history * prices
+
+    return (portfolio_values, cash_history, shares_history,
+            trade_indices[:n_trades], trade_actions[:n_trades],
+            trade_shares[:n_trades], trade_pnls[:n_trades])
+
+def simulate_macd_strategy(df, initial_capital=100000):
+    """
+    Simulates trades based on the MACD strategy.
+    Uses a fixed budget and goes all-in when a buy signal occurs and sells all on a sell signal.
+    
+    Returns:
+      - Updated DataFrame with columns: 'PortfolioValue', 'Cash', 'Shares'.
+      - A trade log DataFrame with trade details.
+    """
+    prices = df['c_price'].to_numpy(np.float64)
+    flags = df['SignalFlag'].to_numpy(np.int8)
+    dates = df['date'].to_numpy()
+
+    (portfolio_values, cash_history, shares_history,
+     trade_indices, trade_actions, trade_shares, trade_pnls) = _simulate_macd_core(prices, flags, initial_capital)
+
+    trade_df = pd.DataFrame({
+        'Date': dates[trade_indices],
+        'Action': pd.Categorical(np.where(trade_actions == 1, 'Buy', 'Sell'), categories=['Buy', 'Sell']),
+        'Shares': trade_shares,
+        'Price': prices[trade_indices],
+        'Signal': flags[trade_indices],
+        'PnL': trade_pnls
+    })
 
     df['PortfolioValue'] = portfolio_values
     df['Cash'] = cash_history
     df['Shares'] = shares_history
-    trade_df = pd.DataFrame(trade_log)
     return df, trade_df
 
-def backtest_buy_and_hold(df, initial_capital=100000):
+def backtest_buy_and_hold(df, initial_capital=100000, inplace=False):
     """
     Simulates a simple buy-and-hold strategy.
     
     Assumes the entire budget is invested on the first day.
     Returns an updated DataFrame with 'PortfolioValueBH'.
     For compatibility in comparisons, it also copies this column to 'PortfolioValue'.
+    Works on a copy of df unless inplace=True.
     """
-    df = df.copy()
-    df['MarketReturn'] = df['c_price'].pct_change()
-    df['PortfolioValueBH'] = (1 + df['MarketReturn']).cumprod() * initial_capital
+    if not inplace:
+        df = df.copy()
+    prices = df['c_price'].to_numpy(np.float64)
+    if len(prices) == 0:
+        # Nothing to normalize against (e.g. an unknown ticker returned no rows).
+        df['PortfolioValueBH'] = prices
+    else:
+        df['PortfolioValueBH'] = initial_capital * prices / prices[0]
     # Set PortfolioValue equal to the buy-and-hold portfolio value for consistent plotting.
     df['PortfolioValue'] = df['PortfolioValueBH']
     return df
 
-def simulate_random_strategy(df, initial_capital=100000, chunk_size=5000):
+@njit(cache=True)
+def _simulate_random_core(prices, draws, initial_capital, chunk_size):
+    """
+    Core loop of the random chunk strategy over raw arrays.
+    `draws` holds one uniform [0, 1) sample per row that picks the action.
+    Trades are recorded into preallocated arrays
+    (action: 1 = buy, 2 = buy averaging down, -1 = sell).
+    """
+    n = prices.shape[0]
+    cash = float(initial_capital)
+    shares = 0
+    avg_cost = 0.0
+
+    portfolio_values = np.empty(n)
+    cash_history = np.empty(n)
+    shares_history = np.empty(n, dtype=np.int32)
+    avg_cost_history = np.empty(n)
+
+    trade_indices = np.empty(n, dtype=np.int64)
+    trade_actions = np.empty(n, dtype=np.int8)
+    trade_shares = np.empty(n, dtype=np.int32)
+    trade_avg_costs = np.empty(n)
+    trade_pnls = np.empty(n)
+    n_trades = 0
+
+    for i in range(n):
+        current_price = prices[i]
+        portfolio_values[i] = cash + shares * current_price
+        cash_history[i] = cash
+        shares_history[i] = shares
+        avg_cost_history[i] = avg_cost if shares > 0 else 0.0
+
+        r = draws[i]
+        if r < 0.6:
+            # No action.
+            continue
+
+        if r < 0.8:
+            action = 1
+        elif shares == 0:
+            # Nothing to sell.
+            continue
+        elif current_price > avg_cost:
+            shares_to_sell = int(chunk_size // current_price)
+            if shares_to_sell > shares:
+                shares_to_sell = shares
+            if shares_to_sell > 0:
+                cash += shares_to_sell * current_price
+                trade_indices[n_trades] = i
+                trade_actions[n_trades] = -1
+                trade_shares[n_trades] = shares_to_sell
+                trade_avg_costs[n_trades] = np.nan
+                trade_pnls[n_trades] = (current_price - avg_cost) * shares_to_sell
+                n_trades += 1
+                shares -= shares_to_sell
+            continue
+        else:
+            # Do not sell at a loss; instead, if cash is available, buy another chunk to average down.
+            action = 2
+
+        if cash >= chunk_size:
+            shares_to_buy = int(chunk_size // current_price)
+            if shares_to_buy > 0:
+                if shares == 0:
+                    avg_cost = current_price
+                else:
+                    avg_cost = (shares * avg_cost + shares_to_buy * current_price) / (shares + shares_to_buy)
+                cash -= shares_to_buy * current_price
+                shares += shares_to_buy
+                trade_indices[n_trades] = i
+                trade_actions[n_trades] = action
+                trade_shares[n_trades] = shares_to_buy
+                trade_avg_costs[n_trades] = avg_cost
+                trade_pnls[n_trades] = np.nan
+                n_trades += 1
+
+    return (portfolio_values, cash_history, shares_history, avg_cost_history,
+            trade_indices[:n_trades], trade_actions[:n_trades], trade_shares[:n_trades],
+            trade_avg_costs[:n_trades], trade_pnls[:n_trades])
+
+def simulate_random_strategy(df, initial_capital=100000, chunk_size=5000, seed=None):
     """
     Simulates a random strategy with fixed monetary chunks.
     
@@ -150,100 +274,74 @@ def simulate_random_strategy(df, initial_capital=100000, chunk_size=5000):
       - shares: Number of shares held.
       - avg_cost: Average purchase price.
     
+    Pass `seed` to make the random decision stream reproducible.
+    
     Returns:
       - Updated DataFrame with 'PortfolioValue', 'Cash', 'Shares', 'AvgCost'.
       - A trade log DataFrame with trade details.
     """
-    cash = initial_capital
-    shares = 0
-    avg_cost = None
-
-    portfolio_values = []
-    cash_history = []
-    shares_history = []
-    avg_cost_history = []
-    trade_log = []
-
-    for index, row in df.iterrows():
-        current_price = row['c_price']
-        portfolio_value = cash + shares * current_price
-        portfolio_values.append(portfolio_value)
-        cash_history.append(cash)
-        shares_history.append(shares)
-        avg_cost_history.append(avg_cost if avg_cost is not None else 0)
-
-        r = random.random()
-        if r < 0.6:
-            action = "None"
-        elif r < 0.8:
-            action = "Buy"
-        else:
-            action = "Sell"
-
-        if action == "Buy":
-            if cash >= chunk_size:
-                shares_to_buy = int(chunk_size // current_price)
-                if shares_to_buy > 0:
-                    if shares == 0:
-                        avg_cost = current_price
-                    else:
-                        avg_cost = (shares * avg_cost + shares_to_buy * current_price) / (shares + shares_to_buy)
-                    cash -= shares_to_buy * current_price
-                    shares += shares_to_buy
-                    trade_log.append({
-                        'Date': row['date'],
-                        'Action': 'Buy',
-                        'Shares': shares_to_buy,
-                        'Price': current_price,
-                        'Chunk': chunk_size,
-                        'NewAvgCost': avg_cost,
-                        'Signal': action
-                    })
-        elif action == "Sell":
-            if shares > 0:
-                if current_price > avg_cost:
-                    shares_to_sell = int(chunk_size // current_price)
-                    if shares_to_sell > shares:
-                        shares_to_sell = shares
-                    if shares_to_sell > 0:
-                        cash += shares_to_sell * current_price
-                        pnl = (current_price - avg_cost) * shares_to_sell
-                        trade_log.append({
-                            'Date': row['date'],
-                            'Action': 'Sell',
-                            'Shares': shares_to_sell,
-                            'Price': current_price,
-                            'Chunk': chunk_size,
-                            'PnL': pnl,
-                            'Signal': action
-                        })
-                        shares -= shares_to_sell
-                        if shares == 0:
-                            avg_cost = None
-                else:
-                    # Do not sell at a loss; instead, if cash is available, buy another chunk to average down.
-                    if cash >= chunk_size:
-                        shares_to_buy = int(chunk_size // current_price)
-                        if shares_to_buy > 0:
-                            if shares == 0:
-                                avg_cost = current_price
-                            else:
-                                avg_cost = (shares * avg_cost + shares_to_buy * current_price) / (shares + shares_to_buy)
-                            cash -= shares_to_buy * current_price
-                            shares += shares_to_buy
-                            trade_log.append({
-                                'Date': row['date'],
-                                'Action': 'Buy (Averaging Down)',
-                                'Shares': shares_to_buy,
-                                'Price': current_price,
-                                'Chunk': chunk_size,
-                                'NewAvgCost': avg_cost,
-                                'Signal': action
-                            })
-        # No action if "None".
+    prices = df['c_price'].to_numpy(np.float64)
+    dates = df['date'].to_numpy()
+    rng = np.random.default_rng(seed)
+    draws = rng.random(len(prices))
+
+    (portfolio_values, cash_history, shares_history, avg_cost_history,
+     trade_indices, trade_actions, trade_shares, trade_avg_costs, trade_pnls) = _simulate_random_core(
+        prices, draws, initial_capital, chunk_size)
+
+    is_buy = trade_actions == 1
+    is_sell = trade_actions == -1
+    trade_df = pd.DataFrame({
+        'Date': dates[trade_indices],
+        'Action': pd.Categorical(
+            np.where(is_buy, 'Buy', np.where(is_sell, 'Sell', 'Buy (Averaging Down)')),
+            categories=['Buy', 'Buy (Averaging Down)', 'Sell']),
+        'Shares': trade_shares,
+        'Price': prices[trade_indices],
+        'Chunk': np.full(len(trade_indices), chunk_size),
+        'NewAvgCost': trade_avg_costs,
+        'Signal': pd.Categorical(np.where(is_buy, 'Buy', 'Sell'), categories=['Buy', 'Sell']),
+        'PnL': trade_pnls
+    })
+
     df['PortfolioValue'] = portfolio_values
     df['Cash'] = cash_history
     df['Shares'] = shares_history
     df['AvgCost'] = avg_cost_history
-    trade_df = pd.DataFrame(trade_log)
     return df, trade_df
+
+def prepare_portfolio_data(symbols, data_period='1y', max_workers=None):
+    """
+    Prepares backtest data for several symbols concurrently, one process per symbol.
+    yf.download keeps its results in module-global state, so concurrent downloads
+    need separate processes rather than threads.
+    
+    Returns a dict mapping each symbol to its prepared DataFrame.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as ex:
+        dfs = list(ex.map(prepare_backtest_data, symbols, repeat(data_period)))
+    return dict(zip(symbols, dfs))
+
+def _run_one(stock_symbol, data_period, strategy_fn):
+    """
+    Prepares the data for one symbol and runs the given strategy on it.
+    """
+    df = prepare_backtest_data(stock_symbol, data_period)
+    return strategy_fn(df)
+
+def run_portfolio(symbols, data_period='1y', strategy_fn=simulate_macd_strategy, max_workers=None):
+    """
+    Backtests a strategy on several symbols in parallel, one process per symbol.
+    
+    Parameters:
+      symbols: List of ticker symbols.
+      data_period: Data period passed to prepare_backtest_data.
+      strategy_fn: A module-level simulator such as simulate_macd_strategy;
+          it must be picklable to be sent to the worker processes.
+      max_workers: Number of worker processes (defaults to the CPU count).
+    
+    Returns a dict mapping each symbol to the strategy's result.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as ex:
+        results = list(ex.map(_run_one, symbols, repeat(data_period), repeat(strategy_fn)))
+    return dict(zip(symbols, results))
@@ -9,20 +9,23 @@ def plot_trade_signals(df, symbol):
     Buy signals (SignalFlag == 1) are marked with green upward arrows,
     and sell signals (SignalFlag == -1) are marked with red downward arrows.
     """
-    plt.figure(figsize=(12,4))
-    plt.plot(df['date'], df['c_price'], label='Close Price', color='blue')
-    
-    # Identify buy and sell signal rows.
-    buy_signals = df[df['SignalFlag'] == 1]
-    sell_signals = df[df['SignalFlag'] == -1]
-    
-    plt.plot(buy_signals['date'], buy_signals['c_price'], '^', markersize=10, color='green', label='Buy Signal')
-    plt.plot(sell_signals['date'], sell_signals['c_price'], 'v', markersize=10, color='red', label='Sell Signal')
-    
-    plt.xlabel('Date')
-    plt.ylabel('Price')
-    plt.title(f'{symbol} - Buy & Sell Signals')
-    plt.legend()
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.show()
+    with plt.rc_context({'path.simplify_threshold': 1.0}):
+        plt.figure(figsize=(12,4))
+        plt.plot(df['date'], df['c_price'], label='Close Price', color='blue', rasterized=True)
+        
+        # Identify buy and sell signal rows.
+        buy_signals = df[df['SignalFlag'] == 1]
+        sell_signals = df[df['SignalFlag'] == -1]
+        
+        # Scatter draws each marker set as a single PathCollection.
+        ax = plt.gca()
+        ax.scatter(buy_signals['date'], buy_signals['c_price'], marker='^', s=100, c='green', label='Buy Signal')
+        ax.scatter(sell_signals['date'], sell_signals['c_price'], marker='v', s=100, c='red', label='Sell Signal')
+        
+        plt.xlabel('Date')
+        plt.ylabel('Price')
+        plt.title(f'{symbol} - Buy & Sell Signals')
+        plt.legend()
+        plt.xticks(rotation=45)
+        plt.tight_layout()
+        plt.show()
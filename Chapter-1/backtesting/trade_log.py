@@ -1,5 +1,6 @@
 # backtesting/trade_log.py
 
+import numpy as np
 import pandas as pd
 
 def generate_trade_log(df):
@@ -16,46 +17,40 @@ def generate_trade_log(df):
       - 'Action': 'Buy' or 'Sell'.
       - 'Price': The price at which the trade occurred.
       - 'SignalFlag': The signal value that triggered the action.
-      - 'PnL': The profit and loss for a sell event (None for buy events).
+      - 'PnL': The profit and loss for a sell event (NaN for buy events).
     
     The function assumes a long-only strategy:
       - A trade is entered on a buy signal (SignalFlag == 1).
       - It is closed on the subsequent sell signal (SignalFlag == -1).
       - The PnL is computed as (exit price - entry price) for each closed trade.
     """
-    trades = []
-    entry_price = None
-    entry_date = None
+    flags = df['SignalFlag'].to_numpy()
+    prices = df['c_price'].to_numpy(np.float64)
+    dates = df['date'].to_numpy()
 
-    # Iterate through the DataFrame row by row.
-    for index, row in df.iterrows():
-        signal = row['SignalFlag']
-        
-        # If a buy signal is encountered and there is no open trade, record the buy.
-        if signal == 1 and entry_price is None:
-            entry_price = row['c_price']
-            entry_date = row['date']
-            trades.append({
-                'Date': row['date'],
-                'Action': 'Buy',
-                'Price': row['c_price'],
-                'SignalFlag': signal,
-                'PnL': None
-            })
-        # If a sell signal is encountered and a trade is open, record the sell and compute PnL.
-        elif signal == -1 and entry_price is not None:
-            exit_price = row['c_price']
-            pnl = exit_price - entry_price  # absolute profit/loss per share
-            trades.append({
-                'Date': row['date'],
-                'Action': 'Sell',
-                'Price': row['c_price'],
-                'SignalFlag': signal,
-                'PnL': pnl
-            })
-            # Reset for the next trade.
-            entry_price = None
-            entry_date = None
+    # Only rows with a signal can be trades.
+    event_idx = np.flatnonzero(flags != 0)
+    event_flags = flags[event_idx]
 
-    trade_df = pd.DataFrame(trades)
+    # A buy while a trade is open, or a sell while none is, is ignored; this is
+    # the same as collapsing runs of repeated signals and dropping a leading sell.
+    keep = np.ones(len(event_idx), dtype=bool)
+    keep[1:] = event_flags[1:] != event_flags[:-1]
+    trade_idx = event_idx[keep]
+    if len(trade_idx) and flags[trade_idx[0]] == -1:
+        trade_idx = trade_idx[1:]
+
+    # Trades now alternate Buy, Sell, Buy, ...; a trailing buy stays open.
+    trade_prices = prices[trade_idx]
+    is_sell = np.arange(len(trade_idx)) % 2 == 1
+    pnls = np.full(len(trade_idx), np.nan)
+    pnls[is_sell] = trade_prices[1::2] - trade_prices[0::2][:is_sell.sum()]  # absolute profit/loss per share
+
+    trade_df = pd.DataFrame({
+        'Date': dates[trade_idx],
+        'Action': pd.Categorical(np.where(is_sell, 'Sell', 'Buy'), categories=['Buy', 'Sell']),
+        'Price': trade_prices,
+        'SignalFlag': flags[trade_idx].astype(np.int8),
+        'PnL': pnls
+    })
     return trade_df
@@ -0,0 +1,16 @@
+# utils/_njit.py
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; fall back to plain Python.
+    def njit(*args, **kwargs):
+        """
+        No-op stand-in for numba.njit.
+        Supports both the bare `@njit` and the `@njit(cache=True)` forms.
+        """
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+
+        def decorator(func):
+            return func
+        return decorator
@@ -1,5 +1,8 @@
 # market_analysis.py
 
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
 import pandas as pd
 import numpy as np
 import yfinance as yf
@@ -8,6 +11,24 @@ from scipy.stats import norm
 from ib_insync import IB, Stock
 import random
 import nest_asyncio
+from utils._njit import njit
+
+try:
+    import numexpr as ne
+except ImportError:  # numexpr is optional; fall back to plain NumPy.
+    ne = None
+
+# Below this many rows numexpr's setup cost outweighs its gains.
+NUMEXPR_MIN_ROWS = 10_000
+
+try:
+    import pyarrow
+except ImportError:  # pyarrow is optional; without it results are not cached.
+    pyarrow = None
+
+# Parquet cache for download_tranform, anchored to the package directory
+# so every working directory shares the same cache.
+CACHE_DIR = Path(__file__).resolve().parent.parent / '.cache'
 
 # Enable nested asyncio to allow IBKR connections in notebooks or interactive sessions.
 nest_asyncio.apply()
@@ -39,7 +60,12 @@ def fetch_iv_data(ib, contract, endDateTime='', durationStr='3 Y',
         useRTH=useRTH,
         formatDate=formatDate
     )
-    return pd.DataFrame([{'date': bar.date, 'c_iv': bar.close} for bar in iv_data])
+    # The bars are Python objects, so a loop is unavoidable; build plain column lists
+    # rather than one dict per bar.
+    return pd.DataFrame({
+        'date': [bar.date for bar in iv_data],
+        'c_iv': [bar.close for bar in iv_data]
+    })
 
 # -----------------------------
 # IBKR Connection Function
@@ -100,11 +126,171 @@ def merge_data(price_df, iv_df):
     Returns:
         A merged DataFrame sorted by date.
     """
-    merged_df = pd.merge(price_df[['date', 'c_price']], iv_df, on='date', how='inner')
+    # Join on an int64 day number rather than datetime64 keys; both feeds are daily bars.
+    price_key = price_df['date'].to_numpy().astype('datetime64[D]').view('i8')
+    iv_key = iv_df['date'].to_numpy().astype('datetime64[D]').view('i8')
+    merged_df = pd.merge(price_df[['date', 'c_price']].assign(_k=price_key),
+                         iv_df.drop(columns='date').assign(_k=iv_key),
+                         on='_k', how='inner')
+    merged_df.drop(columns='_k', inplace=True)
     merged_df.sort_values(by='date', inplace=True)
     merged_df.reset_index(drop=True, inplace=True)
     return merged_df
 
+# -----------------------------
+# Stochastic Oscillator Kernel
+# -----------------------------
+@njit(cache=True)
+def _stoch_kernel(close, k_win=10, d_win=3):
+    """
+    Computes the slow stochastic %K and its %D signal line in a single pass.
+    
+    The rolling k_win-bar low/high are tracked with monotonic index deques and
+    both d_win-bar smoothings use running sums. NaN handling matches pandas'
+    rolling(...).min()/max()/mean(): any NaN in a window makes its output NaN.
+    
+    Parameters:
+        close: 1-D float array of closing prices.
+        k_win: Look-back window for the lowest low / highest high.
+        d_win: Window of both simple moving average smoothings.
+    
+    Returns:
+        A tuple (slow_k, d) of float arrays the same length as close.
+    """
+    n = close.shape[0]
+    slow_k = np.full(n, np.nan)
+    d = np.full(n, np.nan)
+
+    # Monotonic deques of indices into close, stored in preallocated buffers.
+    min_idx = np.empty(n, dtype=np.int64)
+    max_idx = np.empty(n, dtype=np.int64)
+    min_head = min_tail = 0
+    max_head = max_tail = 0
+    close_nans = 0
+
+    k = np.full(n, np.nan)
+    k_sum = 0.0
+    k_nans = 0
+    slow_k_sum = 0.0
+    slow_k_nans = 0
+
+    for i in range(n):
+        v = close[i]
+        if np.isnan(v):
+            close_nans += 1
+        else:
+            while min_tail > min_head and close[min_idx[min_tail - 1]] >= v:
+                min_tail -= 1
+            min_idx[min_tail] = i
+            min_tail += 1
+            while max_tail > max_head and close[max_idx[max_tail - 1]] <= v:
+                max_tail -= 1
+            max_idx[max_tail] = i
+            max_tail += 1
+
+        # Evict the bar that just left the k_win window.
+        if i >= k_win:
+            if np.isnan(close[i - k_win]):
+                close_nans -= 1
+            if min_tail > min_head and min_idx[min_head] <= i - k_win:
+                min_head += 1
+            if max_tail > max_head and max_idx[max_head] <= i - k_win:
+                max_head += 1
+
+        # Raw %K.
+        if i >= k_win - 1 and close_nans == 0:
+            lo = close[min_idx[min_head]]
+            hi = close[max_idx[max_head]]
+            if hi > lo:
+                k[i] = 100 * (v - lo) / (hi - lo)
+
+        # Slow %K: d_win-bar SMA of raw %K.
+        if np.isnan(k[i]):
+            k_nans += 1
+        else:
+            k_sum += k[i]
+        if i >= d_win:
+            if np.isnan(k[i - d_win]):
+                k_nans -= 1
+            else:
+                k_sum -= k[i - d_win]
+        if i >= d_win - 1 and k_nans == 0:
+            slow_k[i] = k_sum / d_win
+
+        # %D: d_win-bar SMA of slow %K.
+        if np.isnan(slow_k[i]):
+            slow_k_nans += 1
+        else:
+            slow_k_sum += slow_k[i]
+        if i >= d_win:
+            if np.isnan(slow_k[i - d_win]):
+                slow_k_nans -= 1
+            else:
+                slow_k_sum -= slow_k[i - d_win]
+        if i >= d_win - 1 and slow_k_nans == 0:
+            d[i] = slow_k_sum / d_win
+
+    return slow_k, d
+
+# -----------------------------
+# Exponential Moving Average Kernel
+# -----------------------------
+@njit(cache=True)
+def _ema_kernel(x, alphas):
+    """
+    Computes one EMA per smoothing factor in a single pass over x.
+    Follows pandas' ewm(alpha=a, adjust=False).mean() recurrence, including how it
+    reweights the first observation after a NaN gap (and its alpha == 0.5 special case).
+    
+    Returns a 2-D array with one row per entry of alphas.
+    """
+    n = x.shape[0]
+    k = alphas.shape[0]
+    out = np.empty((k, n))
+    weighted = np.full(k, np.nan)
+    old_wt = np.ones(k)
+    new_wt = alphas.copy()
+
+    for i in range(n):
+        v = x[i]
+        is_obs = not np.isnan(v)
+        for j in range(k):
+            if not np.isnan(weighted[j]):
+                # The previous value decays once per step, NaN steps included.
+                old_wt[j] *= 1 - alphas[j]
+                if alphas[j] == 0.5:
+                    # pandas treats com == 1 as an irregular-interval series.
+                    new_wt[j] = 1.0 - old_wt[j]
+                if is_obs:
+                    if weighted[j] != v:
+                        weighted[j] = (old_wt[j] * weighted[j] + new_wt[j] * v) / (old_wt[j] + new_wt[j])
+                    old_wt[j] = 1.0
+            elif is_obs:
+                weighted[j] = v
+            out[j, i] = weighted[j]
+
+    return out
+
+def compute_emas(values, spans):
+    """
+    Computes EMAs of the same series for several spans in one pass.
+    
+    Parameters:
+        values: 1-D array-like of values (e.g. closing prices).
+        spans: Sequence of EMA spans; each uses alpha = 2 / (span + 1).
+    
+    Returns:
+        A tuple of float64 arrays, one per span, equal to
+        pd.Series(values).ewm(span=span, adjust=False).mean(), NaN gaps included:
+    
+        >>> x = [np.nan, 1, 2, np.nan, np.nan, 5, 6, np.nan, 3, 4]
+        >>> all(np.allclose(ema, pd.Series(x).ewm(span=span, adjust=False).mean(), equal_nan=True)
+        ...     for ema, span in zip(compute_emas(x, (3, 12, 26)), (3, 12, 26)))
+        True
+    """
+    alphas = 2.0 / (np.asarray(spans, dtype=np.float64) + 1.0)
+    return tuple(_ema_kernel(np.asarray(values, dtype=np.float64), alphas))
+
 # -----------------------------
 # Technical Indicators Calculation
 # -----------------------------
@@ -129,91 +315,137 @@ def compute_technical_indicators(merged_df):
     merged_df['MA_9_grad'] = merged_df['MA_9'].diff()
 
     def gradient_direction(grad):
-        if pd.isna(grad):
-            return None
-        elif grad > 0:
-            return 'increasing'
-        elif grad < 0:
-            return 'decreasing'
-        else:
-            return 'flat'
+        # Bucket gradients into a categorical; NaN gradients stay missing.
+        g = grad.to_numpy()
+        codes = np.select([g > 0, g < 0], [0, 1], default=2)
+        codes[np.isnan(g)] = -1
+        return pd.Categorical.from_codes(codes, categories=['increasing', 'decreasing', 'flat'])
 
-    merged_df['MA_200_dir'] = merged_df['MA_200_grad'].apply(gradient_direction)
-    merged_df['MA_50_dir'] = merged_df['MA_50_grad'].apply(gradient_direction)
-    merged_df['MA_9_dir'] = merged_df['MA_9_grad'].apply(gradient_direction)
+    merged_df['MA_200_dir'] = gradient_direction(merged_df['MA_200_grad'])
+    merged_df['MA_50_dir'] = gradient_direction(merged_df['MA_50_grad'])
+    merged_df['MA_9_dir'] = gradient_direction(merged_df['MA_9_grad'])
 
     # Stochastic Oscillator Calculation (10, 3, 3)
-    merged_df['lowest_10'] = merged_df['c_price'].rolling(window=10).min()
-    merged_df['highest_10'] = merged_df['c_price'].rolling(window=10).max()
-    merged_df['stochastic_%K'] = 100 * (merged_df['c_price'] - merged_df['lowest_10']) / (merged_df['highest_10'] - merged_df['lowest_10'])
-    merged_df['stochastic_slow_%K'] = merged_df['stochastic_%K'].rolling(window=3).mean()
-    merged_df['stochastic_%D'] = merged_df['stochastic_slow_%K'].rolling(window=3).mean()
+    slow_k, d = _stoch_kernel(merged_df['c_price'].to_numpy(np.float64), 10, 3)
+    merged_df['stochastic_%D'] = d
     # Use the smoothed %K as the oscillator value.
-    merged_df['stochastic'] = merged_df['stochastic_slow_%K']
+    merged_df['stochastic'] = slow_k
 
     # MACD Calculation: EMA(12) - EMA(26)
-    merged_df['EMA_12'] = merged_df['c_price'].ewm(span=12, adjust=False).mean()
-    merged_df['EMA_26'] = merged_df['c_price'].ewm(span=26, adjust=False).mean()
-    merged_df['MACD'] = merged_df['EMA_12'] - merged_df['EMA_26']
+    merged_df['EMA_12'], merged_df['EMA_26'] = compute_emas(merged_df['c_price'].to_numpy(), (12, 26))
+    if ne is not None and len(merged_df) >= NUMEXPR_MIN_ROWS:
+        merged_df['MACD'] = ne.evaluate('e12 - e26', local_dict={'e12': merged_df['EMA_12'].to_numpy(),
+                                                                   'e26': merged_df['EMA_26'].to_numpy()})
+    else:
+        merged_df['MACD'] = merged_df['EMA_12'] - merged_df['EMA_26']
+
+    # Derived indicators don't need double precision; float32 halves their memory footprint.
+    # Source prices and IV stay float64 because the simulators trade on them.
+    float_cols = merged_df.select_dtypes('float64').columns.drop(['c_price', 'c_iv'], errors='ignore')
+    merged_df[float_cols] = merged_df[float_cols].astype(np.float32)
 
-    # Drop intermediate columns
-    merged_df.drop(columns=['lowest_10', 'highest_10', 'stochastic_%K', 'stochastic_slow_%K'], inplace=True)
-    
     return merged_df
 
 # -----------------------------
-# Main Function to Execute Workflow
+# Price + IV Download Function
 # -----------------------------
-def download_tranform(stock_symbol='QQQ', data_period='3y'):
+def download_price_and_iv(stock_symbol, data_period='3y'):
     """
-    Main function to perform the entire workflow:
-    1. Connect to IBKR and fetch IV data.
-    2. Download price data.
-    3. Merge the datasets.
-    4. Compute technical indicators.
+    Downloads price data from Yahoo Finance and IV data from IBKR, then merges them.
+    The yfinance download runs in a background thread while IBKR is queried.
     
     Parameters:
         stock_symbol: The ticker symbol to use.
         data_period: The period over which to download price data.
     
     Returns:
-        The final merged DataFrame with computed technical indicators.
+        A DataFrame with 'date', 'c_price' and 'c_iv' columns sorted by date.
     """
-    print(f"Starting download and transformation process for {stock_symbol} with data period {data_period}...")
-    
-    # Connect to IBKR
-    print("Connecting to IBKR...")
-    ib = connect_ibkr()
-    print("IBKR connection established.")
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        # Download price data from Yahoo Finance in the background while IBKR is queried.
+        # ib_insync is bound to this thread's event loop, so the IBKR calls stay here.
+        print("Downloading price data from Yahoo Finance in the background...")
+        fut_px = ex.submit(download_price_data, stock_symbol, data_period=data_period)
+        
+        # Connect to IBKR
+        print("Connecting to IBKR...")
+        ib = connect_ibkr()
+        print("IBKR connection established.")
+        
+        stock_contract = Stock(stock_symbol, 'SMART', 'USD')
+        print(f"Created stock contract for {stock_symbol}.")
+        
+        # Fetch IV data from IBKR
+        print("Fetching IV data from IBKR...")
+        iv_df = fetch_iv_data(ib, stock_contract)
+        iv_df['date'] = pd.to_datetime(iv_df['date'])
+        print(f"IV data fetched: {iv_df.shape[0]} records retrieved.")
+        
+        price_df = fut_px.result()
+        print(f"Price data downloaded: {price_df.shape[0]} records retrieved.")
     
-    stock_contract = Stock(stock_symbol, 'SMART', 'USD')
-    print(f"Created stock contract for {stock_symbol}.")
-    
-    # Fetch IV data from IBKR
-    print("Fetching IV data from IBKR...")
-    iv_df = fetch_iv_data(ib, stock_contract)
-    iv_df['date'] = pd.to_datetime(iv_df['date'])
-    print(f"IV data fetched: {iv_df.shape[0]} records retrieved.")
-    
-    # Download price data from Yahoo Finance
-    print("Downloading price data from Yahoo Finance...")
-    price_df = download_price_data(stock_symbol, data_period=data_period)
-    print(f"Price data downloaded: {price_df.shape[0]} records retrieved.")
+    # Disconnect from IBKR to clean up connection
+    print("Disconnecting from IBKR...")
+    ib.disconnect()
+    print("Disconnected from IBKR.")
     
     # Merge data
     print("Merging price and IV data...")
     merged_df = merge_data(price_df, iv_df)
     print(f"Data merged: {merged_df.shape[0]} records in the merged dataset.")
+    return merged_df
+
+# -----------------------------
+# Main Function to Execute Workflow
+# -----------------------------
+def download_tranform(stock_symbol='QQQ', data_period='3y', use_iv=False, use_cache=True):
+    """
+    Main function to perform the entire workflow:
+    1. Download price data, plus IV data from IBKR if use_iv is set.
+    2. Merge the datasets (only when IV data is used).
+    3. Compute technical indicators.
+    
+    Results are cached per (symbol, period, IV flag, day) as parquet files under CACHE_DIR,
+    so reruns on the same day skip IBKR and Yahoo Finance entirely.
+    Caching is skipped when pyarrow is not installed.
+    
+    Parameters:
+        stock_symbol: The ticker symbol to use.
+        data_period: The period over which to download price data.
+        use_iv: Whether to connect to IBKR and add the 'c_iv' column.
+            The backtests only need prices, so this is off by default.
+        use_cache: Whether to read from and write to the local parquet cache.
+    
+    Returns:
+        The final DataFrame with computed technical indicators.
+    """
+    print(f"Starting download and transformation process for {stock_symbol} with data period {data_period}...")
+    
+    iv_tag = '_iv' if use_iv else ''
+    cache = CACHE_DIR / f"{stock_symbol}_{data_period}{iv_tag}_{date.today()}.parquet"
+    use_cache = use_cache and pyarrow is not None
+    if use_cache and cache.exists():
+        print(f"Loading cached data from {cache}.")
+        return pd.read_parquet(cache, engine='pyarrow')
+    
+    if use_iv:
+        merged_df = download_price_and_iv(stock_symbol, data_period)
+    else:
+        # Download price data from Yahoo Finance only; IBKR is not needed.
+        print("Downloading price data from Yahoo Finance...")
+        price_df = download_price_data(stock_symbol, data_period=data_period)
+        print(f"Price data downloaded: {price_df.shape[0]} records retrieved.")
+        merged_df = price_df[['date', 'c_price']].sort_values(by='date').reset_index(drop=True)
     
     # Compute technical indicators
     print("Computing technical indicators...")
     merged_df = compute_technical_indicators(merged_df)
     print("Technical indicators computed successfully.")
     
-    # Disconnect from IBKR to clean up connection
-    print("Disconnecting from IBKR...")
-    ib.disconnect()
-    print("Disconnected from IBKR.")
+    if use_cache:
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        merged_df.to_parquet(cache, engine='pyarrow')
+        print(f"Cached data to {cache}.")
     
     print("Download and transformation process completed.")
     return merged_df